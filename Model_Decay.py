@@ -0,0 +1,223 @@
+import numpy as np
+
+from Model_Phase import get_count_row, get_count_rows
+
+
+def half_life_to_decay(half_life):
+    '''
+        Returns the decay per observation such that the weight of
+        an observation halves after half_life observations.
+        The half-lives must be positive.
+    '''
+    return 0.5 ** (1 / np.asarray(half_life, dtype=float))
+
+
+class DecayCounts():
+    '''
+        Pseudocounts of a learner that forgets: at every observation the
+        counts gathered so far are multiplied by the decay, after which
+        the new observation is added. The prior pseudocounts do not decay,
+        so the beliefs return to the prior when nothing is observed.
+
+        Decaying every count at every observation would cost O(R x V) per
+        step. Instead the time is only counted, and every row r keeps its
+        evidence relative to the time reference[r] at which it was last
+        renormalised:
+
+            count = prior + evidence * decay**(time - reference)
+
+        New evidence is added divided by that same factor. Only when the
+        factor would underflow is the row renormalised, which is rare and
+        only touches that row.
+
+        decays can be an array of D decay rates, which are all kept in one
+        (D x R x V) tensor; get returns a (D x V) array. Every decay must be
+        in (0, 1], with 1 meaning no forgetting.
+    '''
+
+    def __init__(self, prior, decays):
+        decays = np.atleast_1d(np.asarray(decays, dtype=float))
+        if not np.all((decays > 0) & (decays <= 1)):
+            raise ValueError(f"Decays must be in (0, 1], got {decays}")
+
+        self.prior = np.asarray(prior, dtype=float)
+        self.log_decays = np.log(decays)
+
+        nr_decays = len(self.log_decays)
+        nr_rows = self.prior.shape[0]
+        self.evidence = np.zeros((nr_decays,) + self.prior.shape)
+        self.reference = np.zeros(nr_rows, dtype=int)
+        self.time = 0
+
+
+    def step(self):
+        '''
+            Lets all counts decay once.
+        '''
+        self.time += 1
+
+
+    def _scale(self, row):
+        return np.exp(self.log_decays * (self.time - self.reference[row]))
+
+
+    def add(self, row, index, amount=1.0):
+        '''
+            Adds the amount to the count of the index in the row.
+        '''
+        scale = self._scale(row)
+        if np.min(scale) < 1e-100:
+            self.evidence[:, row] *= scale[:, np.newaxis]
+            self.reference[row] = self.time
+            scale = np.ones_like(scale)
+
+        self.evidence[:, row, index] += amount / scale
+
+
+    def get(self, row):
+        '''
+            Returns the current counts of the row for every decay (D x V).
+        '''
+        return self.prior[row] + self.evidence[:, row] * self._scale(row)[:, np.newaxis]
+
+
+class DecayTPLearner():
+    '''
+        TPLearner whose transition counts decay with every observation.
+        With decay = 1 it is equal to the TPLearner.
+
+        If decay is an array of D rates, they are all learned at once
+        and get_probabilities returns a (D x V) array
+        (see experiment.run_batched_experiment).
+    '''
+
+    def __init__(self, values, decay):
+        self.name = "tp_decay"
+        self.values = values
+        self.decay = decay
+        self.reset()
+
+
+    def reset(self):
+        '''
+            Resets all learning so far.
+        '''
+        self.previous = ""
+        self.alphas = DecayCounts(np.ones((len(self.values), len(self.values))), self.decay)
+
+
+    def process_observation(self, obs):
+        '''
+            Processes the seen shape such per the model (i.e. chunking, TP etc)
+        '''
+        index = self.values.index(obs)
+        self.alphas.step()
+
+        # If no shape has been seen yet, distribute 'weight'
+        # of observation across all possible values uniformly
+        if self.previous == "":
+            for row in range(len(self.values)):
+                self.alphas.add(row, index, 1/len(self.values))
+
+        # Else just update the likelihood of the observed shape
+        # given the previous shape in memory
+        else:
+            self.alphas.add(self.values.index(self.previous), index)
+
+        self.previous = obs
+
+
+    def get_probabilities(self):
+        '''
+            Get the next prediction. This is automatically updated given
+            a series of shapes. I.e. no argument is needed for this method.
+        '''
+        if self.previous == "":
+            probabilities = np.ones((len(self.alphas.log_decays), len(self.values))) / len(self.values)
+        else:
+            row = self.alphas.get(self.values.index(self.previous))
+            probabilities = row / np.sum(row, axis=1, keepdims=True)
+
+        if np.ndim(self.decay) == 0:
+            return list(probabilities[0])
+        return probabilities
+
+
+    def get_number_parameters(self):
+        '''
+            Returns the number of parameters used by the agent.
+            This is used to calculate the BIC score
+        '''
+        return len(self.values) + len(self.values)**2 + 1
+
+
+class DecayChunkLearner():
+    '''
+        Chunk learner (chunking, connected, conjunctive or disconnected)
+        whose counts decay with every observation. With decay = 1 it is
+        equal to the wrapped learner.
+
+        If decay is an array of D rates, they are all learned at once
+        and get_probabilities returns a (D x V) array
+        (see experiment.run_batched_experiment).
+    '''
+
+    def __init__(self, learner, decay):
+        self.learner = learner
+        self.name = learner.name + "_decay"
+
+        self.values = learner.values
+        self.chunk_length = learner.chunk_length
+        self.decay = decay
+        self.reset()
+
+
+    def reset(self):
+        '''
+            Resets all learning so far.
+        '''
+        self.counts = DecayCounts(get_count_rows(self.learner), self.decay)
+        self.memory = []
+
+
+    def _row(self):
+        '''
+            Returns the count row for the current memory.
+        '''
+        if len(self.memory) == 0:
+            return 0
+        return int(get_count_row(self.learner, len(self.memory), self.memory[0], self.memory[-1]))
+
+
+    def process_observation(self, obs):
+        '''
+            Processes the seen shape such per the model (i.e. chunking, TP etc)
+        '''
+        index = self.values.index(obs)
+        self.counts.step()
+        self.counts.add(self._row(), index)
+
+        self.memory.append(index)
+        if (len(self.memory) >= self.chunk_length):
+            self.memory = []
+
+
+    def get_probabilities(self):
+        '''
+            Get the next prediction. This is automatically updated given
+            a series of shapes. I.e. no argument is needed for this method.
+        '''
+        row = self.counts.get(self._row())
+        probabilities = row / np.sum(row, axis=1, keepdims=True)
+
+        if np.ndim(self.decay) == 0:
+            return list(probabilities[0])
+        return probabilities
+
+
+    def get_number_parameters(self):
+        '''
+            Returns the number of parameters used by the agent.
+            This is used to calculate the BIC score
+        '''
+        return self.learner.get_number_parameters() + 1
@@ -0,0 +1,152 @@
+import numpy as np
+
+from Model_Disconnected import DisconnectedChunkLearner
+
+
+def get_count_rows(learner):
+    '''
+        Resets the chunk learner and returns its prior pseudocounts as
+        one (R x V) array: the row of the first position, then the rows
+        of the contexts of the second position, then those of the third.
+    '''
+    learner.reset()
+    values = learner.values
+
+    rows = [learner.first_prob]
+    if isinstance(learner, DisconnectedChunkLearner):
+        rows += [learner.second_prob[v] for v in values]
+        rows += [learner.third_prob[v] for v in values]
+    else:
+        rows += [learner.second_prob[str([v])] for v in values]
+        rows += [learner.third_prob[str([v1, v2])] for v1 in values for v2 in values]
+
+    return np.array(rows, dtype=float)
+
+
+def get_count_row(learner, position, first, last):
+    '''
+        Returns the row of get_count_rows that the chunk learner uses for
+        the next observation, given its position within the chunk, the
+        index of the first shape of the chunk and that of the last shape.
+        The arguments can also be arrays, giving an array of rows.
+    '''
+    nr_values = len(learner.values)
+
+    # Disconnected learners condition both later positions on the
+    # first shape of the chunk, the others on all shapes before it
+    if isinstance(learner, DisconnectedChunkLearner):
+        context = first
+    else:
+        context = first * nr_values + last
+
+    return np.select([position == 0, position == 1], [0, 1 + last], 1 + nr_values + context)
+
+
+class PhaseChunkLearner():
+    '''
+        Runs a chunk learner (chunking, connected, conjunctive or
+        disconnected) for every phase offset of the chunk boundaries at once.
+
+        The base learners start a new chunk every chunk_length observations
+        counted from the first stimulus. With phase offset k, the first
+        chunk only holds the first k observations, after which chunks of
+        chunk_length follow. Offset 0 is the base learner.
+
+        All counts live in one tensor of shape (K x R x V), with K the
+        number of phases, R the number of count rows (one for the first
+        position, then one per context of the second and third position)
+        and V the number of values. Each observation updates one row per
+        phase, so the cost is about that of a single learner.
+
+        If mixture is False, get_probabilities returns a (K x V) array with
+        the prediction of each phase. If mixture is True, the phases are
+        averaged by their posterior probability given the observations so
+        far, and a single prediction is returned like any other agent.
+
+        dtype is the type of the count tensor. As all counts are whole
+        numbers, a compact integer type can be used (see precision.count_dtype).
+    '''
+
+    def __init__(self, learner, mixture=False, dtype=float):
+        self.learner = learner
+        self.name = learner.name + ("_phase_mixture" if mixture else "_phase")
+
+        self.values = learner.values
+        self.chunk_length = learner.chunk_length
+        self.mixture = mixture
+        self.dtype = dtype
+        self.reset()
+
+
+    def reset(self):
+        '''
+            Resets all learning so far.
+        '''
+        rows = get_count_rows(self.learner)
+        self.counts = np.tile(rows, (self.chunk_length, 1, 1)).astype(self.dtype)
+        self.phases = np.arange(self.chunk_length)
+
+        # Row of the counts used by each phase for the next observation,
+        # and the index of the first shape of the current chunk per phase
+        self.rows = np.zeros(self.chunk_length, dtype=int)
+        self.first = np.zeros(self.chunk_length, dtype=int)
+        self.nr_observations = 0
+
+        self.phase_posterior = np.ones(self.chunk_length) / self.chunk_length
+
+
+    def _positions(self, t):
+        '''
+            Returns the position within the current chunk of observation t
+            for every phase.
+        '''
+        return np.where(t < self.phases, t, (t - self.phases) % self.chunk_length)
+
+
+    def process_observation(self, obs):
+        '''
+            Processes the seen shape for all phases at once.
+        '''
+        index = self.values.index(obs)
+
+        if self.mixture:
+            likelihood = self._phase_probabilities()[:, index]
+            self.phase_posterior = self.phase_posterior * likelihood
+            self.phase_posterior /= np.sum(self.phase_posterior)
+
+        # Integer counts would silently wrap around when they overflow
+        if np.issubdtype(self.counts.dtype, np.integer) and \
+                np.any(self.counts[self.phases, self.rows, index] == np.iinfo(self.counts.dtype).max):
+            raise OverflowError(f"Counts do not fit in {self.counts.dtype}")
+        self.counts[self.phases, self.rows, index] += 1
+
+        # Remember the shape for the context of the next observation
+        positions = self._positions(self.nr_observations)
+        self.first = np.where(positions == 0, index, self.first)
+
+        self.nr_observations += 1
+        self.rows = get_count_row(self.learner, self._positions(self.nr_observations), self.first, index)
+
+
+    def _phase_probabilities(self):
+        counts = self.counts[self.phases, self.rows].astype(float)
+        return counts / np.sum(counts, axis=1, keepdims=True)
+
+
+    def get_probabilities(self):
+        '''
+            Get the next prediction. This is automatically updated given
+            a series of shapes. I.e. no argument is needed for this method.
+        '''
+        probabilities = self._phase_probabilities()
+        if self.mixture:
+            return list(self.phase_posterior @ probabilities)
+        return probabilities
+
+
+    def get_number_parameters(self):
+        '''
+            Returns the number of parameters used by the agent.
+            This is used to calculate the BIC score
+        '''
+        return self.learner.get_number_parameters()
@@ -0,0 +1,103 @@
+import numpy as np
+
+
+def fold_labels(nr_participants, k=0, seed=0):
+    '''
+        Assigns every participant to one of k folds of (nearly) equal size
+        in a random order. With k = 0 (or k equal to the number of
+        participants) every participant is its own fold, i.e.
+        leave-one-participant-out.
+
+        RETURNS an array with the fold of each participant
+    '''
+    if nr_participants < 2:
+        raise ValueError(f"Cannot cross-validate with {nr_participants} participant(s), at least 2 are needed")
+    if k == 0 or k == nr_participants:
+        return np.arange(nr_participants)
+    if not 1 < k <= nr_participants:
+        raise ValueError(f"Cannot make {k} folds of {nr_participants} participants")
+
+    order = np.random.default_rng(seed).permutation(nr_participants)
+    labels = np.zeros(nr_participants, dtype=int)
+    labels[order] = np.arange(nr_participants) % k
+    return labels
+
+
+def held_out_aggregates(values, labels):
+    '''
+        Given per-participant values (P x ...) and the fold of each
+        participant, returns the mean and standard error across the
+        participants that are not in each fold, both (K x ...).
+        The standard error is computed as in main.aggregate.
+
+        The sums over all participants are made once, after which the
+        sums of every fold are subtracted from them. All folds together
+        therefore cost about as much as one aggregate over the cohort.
+        The values are centred on the cohort mean first, so that
+        subtracting the sums of squares stays accurate.
+    '''
+    values = np.asarray(values, dtype=float)
+    nr_folds = np.max(labels) + 1
+
+    centred = values - np.mean(values, axis=0)
+    fold_sums = np.zeros((nr_folds,) + values.shape[1:])
+    fold_squares = np.zeros((nr_folds,) + values.shape[1:])
+    np.add.at(fold_sums, labels, centred)
+    np.add.at(fold_squares, labels, centred**2)
+
+    expand = (slice(None),) + (np.newaxis,) * (values.ndim - 1)
+    n = (len(labels) - np.bincount(labels, minlength=nr_folds))[expand]
+
+    # The centred values sum to zero over the cohort
+    mean = -fold_sums / n
+    variance = (np.sum(centred**2, axis=0) - fold_squares) / n - mean**2
+    se = np.sqrt(np.maximum(variance, 0)) / np.sqrt(n)
+
+    return mean + np.mean(values, axis=0), se
+
+
+def cross_validate(results, k=0, seed=0):
+    '''
+        Cross-validates the group-level conclusions from the results of
+        main.compute across participants (leave-one-participant-out if
+        k = 0, otherwise k-fold).
+
+        For each fold, the average posteriors (and their SE) are computed
+        on the other participants. The agent with the highest average
+        final posterior there is the group-level winner, which is checked
+        against the winner of each held-out participant.
+
+        RETURNS a dictionary with the folds of the participants, the
+        averages and SEs per fold (K x ...), and the fraction of held-out
+        participants whose winner matches the group-level winner, overall
+        and per triplet type. If an RT linking model was fitted, the
+        averages of its parameters per fold are included as well.
+    '''
+    posterior = results["posterior"]
+    triplet_posterior = results["triplet_posterior"]
+    labels = fold_labels(len(posterior), k, seed)
+
+    avg_posterior, posterior_se = held_out_aggregates(posterior, labels)
+    avg_triplet_posterior, triplet_posterior_se = held_out_aggregates(triplet_posterior, labels)
+
+    # Winners on the final posterior: of the group without the fold
+    # of each participant, and of each participant itself
+    group_winner = np.argmax(avg_posterior[labels, :, -1], axis=-1)
+    own_winner = np.argmax(posterior[:, :, -1], axis=-1)
+    triplet_group_winner = np.argmax(avg_triplet_posterior[labels, :, :, -1], axis=-1)
+    triplet_own_winner = np.argmax(triplet_posterior[:, :, :, -1], axis=-1)
+
+    cv = {"labels": labels,
+          "avg_posterior": avg_posterior,
+          "posterior_se": posterior_se,
+          "avg_triplet_posterior": avg_triplet_posterior,
+          "triplet_posterior_se": triplet_posterior_se,
+          "agreement": np.mean(group_winner == own_winner),
+          "triplet_agreement": np.mean(triplet_group_winner == triplet_own_winner, axis=0)}
+
+    linking = results.get("linking")
+    if linking is not None:
+        for parameter in ("intercept", "slope", "sigma"):
+            cv["avg_" + parameter], cv[parameter + "_se"] = held_out_aggregates(getattr(linking, parameter), labels)
+
+    return cv
@@ -1,8 +1,11 @@
-from scipy.stats import entropy
 import numpy as np
-import matplotlib.pyplot as plt
 import os
 
+# matplotlib and scipy.stats are slow to import. matplotlib is therefore
+# only imported by the functions that draw images, and zscore and norm_pdf
+# below replace their scipy.stats versions. This keeps computing the
+# posteriors (e.g. in worker processes) free of that startup cost.
+
 
 def read_data(filename, delimiter=";"):
     '''
@@ -45,6 +48,31 @@ def read_data(filename, delimiter=";"):
 
 
 
+def zscore(a, axis=0):
+    '''
+        Zero-mean, unit-variance scaling along the axis,
+        equal to scipy.stats.zscore: constant slices become NaN.
+    '''
+    a = np.asarray(a, dtype=float)
+    mean = np.mean(a, axis=axis, keepdims=True)
+    std = np.std(a, axis=axis, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = (a - mean) / std
+    z[np.broadcast_to(std <= np.abs(np.finfo(float).eps * mean), z.shape)] = np.nan
+    return z
+
+
+
+def norm_pdf(x, loc=0.0, scale=1.0):
+    '''
+        Probability density of a normal distribution,
+        equal to scipy.stats.norm.pdf.
+    '''
+    x = (np.asarray(x) - loc) / scale
+    return np.exp(-x**2/2.0) / np.sqrt(2*np.pi) / scale
+
+
+
 def run_experiment(agent, shapes):
     '''
         Optional argument: convert_rts. If True, this will make sure the
@@ -65,10 +93,7 @@ def run_experiment(agent, shapes):
         # Get the prior belief
         prior = agent.get_probabilities()
 
-        # Convert shape name into a one-hot list
-        obs = [0 for _ in prior]
         index = agent.values.index(shape)
-        obs[index] = 1
 
         # Update the log-likelihood (for BIC)
         log_likelihoods.append(np.log(prior[index]))
@@ -79,8 +104,9 @@ def run_experiment(agent, shapes):
         # Get the posterior belief
         posterior = agent.get_probabilities()
 
-        # Determine predicted RT
-        pred_rt = entropy(obs, qk=prior, base=2)
+        # Determine predicted RT as the relative entropy of the one-hot
+        # observation given the (normalised) prior, i.e. the surprisal
+        pred_rt = np.log(np.sum(prior) / prior[index]) / np.log(2)
         
         predicted_rts.append(pred_rt)
 
@@ -88,6 +114,34 @@ def run_experiment(agent, shapes):
 
 
 
+def run_batched_experiment(agent, shapes):
+    '''
+        Same as run_experiment, but for agents whose get_probabilities
+        returns a (B x V) array, i.e. B predictions at once (such as
+        the PhaseChunkLearner without mixture).
+
+        Returns a (B x N) matrix of predicted response times and of
+        log-likelihoods.
+    '''
+    predicted_rts = []
+    log_likelihoods = []
+
+    for shape in shapes:
+        # Get the prior belief of every batch member
+        prior = np.asarray(agent.get_probabilities())
+        index = agent.values.index(shape)
+
+        # The entropy of a one-hot observation relative to the prior
+        # is the surprisal of the observed shape
+        log_likelihoods.append(np.log(prior[:, index]))
+        predicted_rts.append(-np.log2(prior[:, index]))
+
+        agent.process_observation(shape)
+
+    return np.array(predicted_rts).T, np.array(log_likelihoods).T
+
+
+
 def create_posterior_images(agents, filename, posterior, triplet_types, triplet_posterior,
                             posterior_se=None, triplet_posterior_se=None):
     '''
@@ -98,6 +152,7 @@ def create_posterior_images(agents, filename, posterior, triplet_types, triplet_
         The graphs are saved in the results folder. This is created if non-existent
         when calling this function.
     '''
+    import matplotlib.pyplot as plt
 
     # Make sure that there is a results folder
     if not(os.path.exists("results")):
@@ -150,6 +205,8 @@ def create_posterior_images(agents, filename, posterior, triplet_types, triplet_
 
 
 def create_rt_images(agents, filename, true_rts, pred_rts):
+    import matplotlib.pyplot as plt
+
     # Make sure that there is a results folder
     if not(os.path.exists("results")):
         os.mkdir("results")
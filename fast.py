@@ -0,0 +1,122 @@
+import numpy as np
+
+import experiment
+from Model_Baseline import BaselineLearner
+from Model_Chunking import JointChunkLearner
+from Model_Connected import ConnectedChunkLearner
+from Model_Disconnected import DisconnectedChunkLearner
+from Model_Conjunctive import ConjunctiveChunkLearner
+from Model_Phase import get_count_row, get_count_rows
+from Model_TP import TPLearner
+
+'''
+    Fast backend of the analysis. The learners of the Model_X.py files
+    (the reference backend) update their counts one observation at a time.
+    Their predictions can however be computed for the whole sequence at
+    once: the count of a shape in a context before trial t is its prior
+    pseudocount plus the number of earlier trials with the same context
+    and shape. Counting those for all trials takes a few numpy calls.
+
+    The results equal those of the reference backend up to rounding,
+    which is checked by harness.py.
+'''
+
+CHUNK_LEARNERS = (JointChunkLearner, ConnectedChunkLearner,
+                  ConjunctiveChunkLearner, DisconnectedChunkLearner)
+
+
+def count_previous(keys):
+    '''
+        Returns for every position the number of earlier
+        positions with the same key.
+    '''
+    keys = np.asarray(keys)
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    # Index (in sorted order) of the first position of every group of keys
+    starts = np.r_[0, np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1]
+    group_start = np.repeat(starts, np.diff(np.r_[starts, len(keys)]))
+
+    counts = np.empty(len(keys), dtype=int)
+    counts[order] = np.arange(len(keys)) - group_start
+    return counts
+
+
+def get_tp_probabilities(values, indices):
+    '''
+        Probability of each observed shape before it was seen under
+        the TPLearner, for the shape indices of the whole sequence.
+    '''
+    nr_values = len(values)
+    probabilities = np.ones(len(indices)) / nr_values
+    if len(indices) < 2:
+        return probabilities
+
+    previous, current = indices[:-1], indices[1:]
+
+    # The first shape adds 1/V to its column in every row
+    counts = 1 + count_previous(previous * nr_values + current) + (current == indices[0]) / nr_values
+    totals = nr_values + count_previous(previous) + 1 / nr_values
+    probabilities[1:] = counts / totals
+    return probabilities
+
+
+def get_chunk_probabilities(learner, indices):
+    '''
+        Probability of each observed shape before it was seen under one
+        of the chunk learners, for the shape indices of the whole sequence.
+    '''
+    nr_values = len(learner.values)
+    prior = get_count_rows(learner)
+    positions = np.arange(len(indices)) % learner.chunk_length
+
+    # Row of the counts of each trial
+    first = np.repeat(indices[::learner.chunk_length], learner.chunk_length)[:len(indices)]
+    last = np.r_[0, indices[:-1]]
+    rows = get_count_row(learner, positions, first, last)
+
+    counts = prior[rows, indices] + count_previous(rows * nr_values + indices)
+    totals = np.sum(prior, axis=1)[rows] + count_previous(rows)
+    return counts / totals
+
+
+def run_experiment(agent, shapes):
+    '''
+        Same as experiment.run_experiment, but computed for the whole
+        sequence at once for the TP, chunk and baseline learners. Other
+        agents are ran by experiment.run_experiment. Unlike the
+        reference, the agent itself is not updated.
+
+        Returns a vector of predicted response times and of log-likelihoods.
+    '''
+    lookup = {value: i for i, value in enumerate(agent.values)}
+    indices = np.array([lookup[shape] for shape in shapes], dtype=int)
+
+    if type(agent) is TPLearner:
+        probabilities = get_tp_probabilities(agent.values, indices)
+    elif type(agent) in CHUNK_LEARNERS:
+        probabilities = get_chunk_probabilities(agent, indices)
+    elif type(agent) is BaselineLearner:
+        probabilities = np.array(agent.prediction)[indices]
+    else:
+        predicted_rts, log_likelihoods = experiment.run_experiment(agent, shapes)
+        return np.array(predicted_rts), np.array(log_likelihoods)
+
+    return -np.log2(probabilities), np.log(probabilities)
+
+
+def compare_rts(likelihoods):
+    '''
+        The posterior recursion of main.compare_rts for all trials at once:
+        the posterior after trial i is proportional to the product of the
+        likelihoods up to i, computed as a cumulative sum of logarithms.
+        The sum is made in double precision, as its rounding errors add
+        up over the trials, and the result is returned in the type of
+        the likelihoods.
+    '''
+    with np.errstate(divide='ignore'):
+        log_posteriors = np.cumsum(np.log(likelihoods.astype(np.float64)), axis=1)
+    log_posteriors -= np.max(log_posteriors, axis=0, keepdims=True)
+    posteriors = np.exp(log_posteriors)
+    return (posteriors / np.sum(posteriors, axis=0, keepdims=True)).astype(likelihoods.dtype)
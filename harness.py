@@ -0,0 +1,341 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+import experiment
+import fast
+import main
+from precision import PRECISIONS, check_accuracy
+
+from Model_Chunking import JointChunkLearner
+from Model_Connected import ConnectedChunkLearner
+from Model_Disconnected import DisconnectedChunkLearner
+from Model_Conjunctive import ConjunctiveChunkLearner
+from Model_Decay import DecayChunkLearner, DecayTPLearner, half_life_to_decay
+from Model_Phase import PhaseChunkLearner
+from Model_TP import TPLearner
+
+'''
+    Checks that the fast backend (fast.py) computes the same as the
+    reference backend (the Model_X.py learners, experiment.run_experiment
+    and main.compare_rts), and reports how much faster it is.
+
+    It compares, for every stage:
+        learners    - the probabilities and predicted RTs of every agent,
+                      on the data files and on random synthetic sequences
+        posteriors  - main.compare_rts on the predicted RTs of the data
+                      files, in every precision
+        pipeline    - the posteriors of main.compute on the data files,
+                      in every precision
+        precision   - main.compute of each backend in single against
+                      double precision (see precision.check_accuracy); its
+                      times are those of double and single precision
+    The last three are ran for every set of agents in MODEL_SETS.
+
+    It also checks that the learners of Model_Phase.py and Model_Decay.py
+    reduce to the learners they wrap, on the synthetic sequences:
+        phases      - phase offset 0 of PhaseChunkLearner against the
+                      chunk learner itself
+        decay 1     - the decay learners with decay 1 against the TP and
+                      chunk learners
+        decays      - the decay learners with several decays at once
+                      against NaiveDecayCounts
+
+    Run it with python harness.py (see python harness.py --help). It exits
+    with a non-zero status if any difference is larger than the tolerance.
+'''
+
+# The sets of agents that are compared by default: those of the paper, and
+# a set with a phase mixture. Which posteriors get small enough to underflow
+# in single precision depends on the agents they are compared with.
+MODEL_SETS = [main.DEFAULT_MODELS, ["tp", "chunking", "chunking_phase_mixture", "baseline"]]
+
+CHUNK_LEARNERS = [JointChunkLearner, ConnectedChunkLearner, DisconnectedChunkLearner, ConjunctiveChunkLearner]
+
+# The decays of the decays check. A half-life of 1 makes the lazy
+# counts of Model_Decay.DecayCounts renormalise rows.
+HALF_LIVES = [1, 10, 1000]
+
+
+class NaiveDecayCounts():
+    '''
+        Same as Model_Decay.DecayCounts, but lets every count
+        decay at every observation.
+    '''
+
+    def __init__(self, prior, decays):
+        self.prior = np.asarray(prior, dtype=float)
+        self.decays = np.atleast_1d(np.asarray(decays, dtype=float))
+        self.log_decays = np.log(self.decays)
+        self.evidence = np.zeros((len(self.decays),) + self.prior.shape)
+
+
+    def step(self):
+        self.evidence *= self.decays[:, np.newaxis, np.newaxis]
+
+
+    def add(self, row, index, amount=1.0):
+        self.evidence[:, row, index] += amount
+
+
+    def get(self, row):
+        return self.prior[row] + self.evidence[:, row]
+
+
+def make_sequences(nr_sequences, seed=0):
+    '''
+        Creates random sequences of shapes: half of them made of random
+        triplets (as in the experiment), half of independent shapes.
+
+        RETURNS a list of (values, shapes)
+    '''
+    rng = np.random.default_rng(seed)
+    sequences = []
+    for i in range(nr_sequences):
+        nr_values = rng.integers(2, 25)
+        values = [f"shape_{v}" for v in range(nr_values)]
+        length = 3 * rng.integers(1, 300)
+
+        if i % 2 == 0:
+            triplets = rng.integers(0, nr_values, size=(rng.integers(1, 9), 3))
+            indices = triplets[rng.integers(0, len(triplets), size=length // 3)].ravel()
+        else:
+            indices = rng.integers(0, nr_values, size=length)
+        sequences.append((values, [values[index] for index in indices]))
+
+    return sequences
+
+
+def _timed(function, *arguments):
+    start = time.perf_counter()
+    result = function(*arguments)
+    return result, time.perf_counter() - start
+
+
+def check_learners(sequences, models=main.DEFAULT_MODELS):
+    '''
+        Compares the probabilities of the observed shapes and the predicted
+        RTs of the reference and fast learners on every sequence.
+
+        RETURNS the largest absolute difference, the time of the reference
+                and the time of the fast backend
+    '''
+    difference = 0
+    reference_time = 0
+    fast_time = 0
+    for values, shapes in sequences:
+        for model in models:
+            (reference_rts, reference_ll), duration = _timed(experiment.run_experiment,
+                                                             main.MODELS[model](values), shapes)
+            reference_time += duration
+            (fast_rts, fast_ll), duration = _timed(fast.run_experiment, main.MODELS[model](values), shapes)
+            fast_time += duration
+
+            difference = max(difference,
+                             np.max(np.abs(np.exp(reference_ll) - np.exp(fast_ll))),
+                             np.max(np.abs(np.array(reference_rts) - fast_rts)))
+
+    return difference, reference_time, fast_time
+
+
+def check_posteriors(results):
+    '''
+        Compares main.compare_rts of both backends on the predicted RTs
+        of the results of main.compute.
+    '''
+    difference = 0
+    reference_time = 0
+    fast_time = 0
+    for pred_rts, true_rts in zip(results["pred_rts"], results["true_rts"]):
+        reference, duration = _timed(main.compare_rts, pred_rts, true_rts, None, "reference")
+        reference_time += duration
+        posterior, duration = _timed(main.compare_rts, pred_rts, true_rts, None, "fast")
+        fast_time += duration
+
+        difference = max(difference, np.max(np.abs(reference - posterior)))
+
+    return difference, reference_time, fast_time
+
+
+def check_pipeline(reference, results):
+    '''
+        Compares the posteriors of main.compute of both backends.
+    '''
+    return max(np.max(np.abs(reference["posterior"] - results["posterior"])),
+               np.max(np.abs(reference["triplet_posterior"] - results["triplet_posterior"])))
+
+
+def check_precision(reference, results):
+    '''
+        Compares the posteriors of main.compute in single precision
+        with those in double precision.
+
+        RETURNS the largest absolute difference, or infinity if
+                a participant has another winning agent
+    '''
+    report = check_accuracy(reference, results)
+    if not report["same_winners"]:
+        return np.inf
+    return max(report["posterior"], report["triplet_posterior"])
+
+
+def check_phases(sequences):
+    '''
+        Compares the predicted RTs of phase offset 0 of the
+        PhaseChunkLearner with those of the chunk learner it wraps.
+
+        RETURNS the largest absolute difference
+    '''
+    difference = 0
+    for values, shapes in sequences:
+        for learner in CHUNK_LEARNERS:
+            rts, _ = experiment.run_experiment(learner(values), shapes)
+            phase_rts, _ = experiment.run_batched_experiment(PhaseChunkLearner(learner(values)), shapes)
+            difference = max(difference, np.max(np.abs(np.array(rts) - phase_rts[0])))
+
+    return difference
+
+
+def _make_decay_learners(values, decay):
+    learners = [DecayTPLearner(values, decay)]
+    return learners + [DecayChunkLearner(learner(values), decay) for learner in CHUNK_LEARNERS]
+
+
+def check_no_decay(sequences):
+    '''
+        Compares the predicted RTs of the decay learners with decay 1
+        with those of the TP and chunk learners.
+
+        RETURNS the largest absolute difference
+    '''
+    difference = 0
+    for values, shapes in sequences:
+        learners = [TPLearner(values)] + [learner(values) for learner in CHUNK_LEARNERS]
+        for learner, decay_learner in zip(learners, _make_decay_learners(values, 1)):
+            rts, _ = experiment.run_experiment(learner, shapes)
+            decay_rts, _ = experiment.run_experiment(decay_learner, shapes)
+            difference = max(difference, np.max(np.abs(np.array(rts) - decay_rts)))
+
+    return difference
+
+
+def check_decays(sequences, half_lives=HALF_LIVES):
+    '''
+        Compares the predicted RTs of the decay learners for several
+        decays at once with those computed by NaiveDecayCounts.
+
+        RETURNS the largest absolute difference
+    '''
+    decays = half_life_to_decay(half_lives)
+    difference = 0
+    for values, shapes in sequences:
+        naive_learners = _make_decay_learners(values, decays)
+        for learner in naive_learners:
+            if isinstance(learner, DecayTPLearner):
+                learner.alphas = NaiveDecayCounts(learner.alphas.prior, decays)
+            else:
+                learner.counts = NaiveDecayCounts(learner.counts.prior, decays)
+
+        for naive_learner, learner in zip(naive_learners, _make_decay_learners(values, decays)):
+            naive_rts, _ = experiment.run_batched_experiment(naive_learner, shapes)
+            rts, _ = experiment.run_batched_experiment(learner, shapes)
+            difference = max(difference, np.max(np.abs(naive_rts - rts)))
+
+    return difference
+
+
+def run(folder="data/", filenames=None, nr_sequences=20, tolerance=1e-9, seed=0,
+        single_tolerance=1e-5, model_sets=MODEL_SETS, precisions=PRECISIONS):
+    '''
+        Runs all checks and prints a report. The posteriors and pipeline
+        are checked for every set of agents in all precisions, and in
+        single precision against single_tolerance instead of tolerance.
+        RETURNS True if all differences are within their tolerance
+    '''
+    if filenames is None:
+        filenames = main.list_participants(folder)
+    tolerances = {"double": tolerance, "single": single_tolerance}
+
+    data = []
+    for filename in filenames:
+        _, shapes, _ = experiment.read_data(os.path.join(folder, filename), delimiter=",")
+        data.append((list(set(shapes)), shapes))
+
+    # Every agent of the sets once
+    models = list(dict.fromkeys(model for models in model_sets for model in models))
+    sequences = make_sequences(nr_sequences, seed)
+    report = [("learners (data)",) + check_learners(data, models) + (tolerance,),
+              ("learners (synthetic)",) + check_learners(sequences, models) + (tolerance,)]
+
+    for n, models in enumerate(model_sets):
+        computed = {}
+        for precision in precisions:
+            reference, reference_time = _timed(main.compute, folder, filenames, models,
+                                               False, "normal", 1, precision)
+            results, fast_time = _timed(main.compute, folder, filenames, models,
+                                        False, "normal", 1, precision, "fast")
+            computed[precision] = {"reference": (reference, reference_time), "fast": (results, fast_time)}
+
+            report += [(f"posteriors ({precision}, {n+1})",) + check_posteriors(reference)
+                       + (tolerances[precision],),
+                       (f"pipeline ({precision}, {n+1})", check_pipeline(reference, results),
+                        reference_time, fast_time, tolerances[precision])]
+
+        if "double" in computed and "single" in computed:
+            for backend in main.BACKENDS:
+                double, double_time = computed["double"][backend]
+                single, single_time = computed["single"][backend]
+                report.append((f"precision ({backend}, {n+1})", check_precision(double, single),
+                               double_time, single_time, single_tolerance))
+
+    # These compare learners with each other, not backends
+    report.append(("phases", check_phases(sequences), None, None, tolerance))
+    report.append(("decay 1", check_no_decay(sequences), None, None, tolerance))
+    report.append(("decays", check_decays(sequences), None, None, tolerance))
+
+    print()
+    for n, models in enumerate(model_sets):
+        print(f"agents {n+1}: {' '.join(models)}")
+    print(f"\n{'stage':<28}{'max difference':>16}{'reference (s)':>15}{'fast (s)':>10}{'speedup':>9}")
+    passed = True
+    for stage, difference, reference_time, fast_time, tolerance in report:
+        passed = passed and difference <= tolerance
+        status = "" if difference <= tolerance else "  FAILED"
+        if reference_time is None:
+            print(f"{stage:<28}{difference:>16.2e}{status}")
+        else:
+            print(f"{stage:<28}{difference:>16.2e}{reference_time:>15.3f}{fast_time:>10.3f}"
+                  f"{reference_time / fast_time:>8.1f}x{status}")
+
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the fast backend against the reference backend.")
+    parser.add_argument("--folder", default="data/",
+                        help="folder with the participant csv files (default: data/)")
+    parser.add_argument("--participants", nargs="+", default=None,
+                        help="participant files to use, e.g. 1S 2S (default: all)")
+    parser.add_argument("--models", nargs="+", default=None, choices=list(main.MODELS),
+                        help="agents to check (default: each set of MODEL_SETS)")
+    parser.add_argument("--precision", nargs="+", default=PRECISIONS, choices=PRECISIONS,
+                        help="precisions of the posterior and pipeline checks (default: all)")
+    parser.add_argument("--synthetic", type=int, default=20,
+                        help="number of random synthetic sequences (default: 20)")
+    parser.add_argument("--tolerance", type=float, default=1e-9,
+                        help="largest allowed absolute difference in double precision (default: 1e-9)")
+    parser.add_argument("--single-tolerance", type=float, default=1e-5,
+                        help="largest allowed difference in single precision (default: 1e-5)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the synthetic sequences")
+    args = parser.parse_args()
+
+    model_sets = MODEL_SETS if args.models is None else [args.models]
+    filenames = None
+    if args.participants is not None:
+        filenames = [p if p.endswith(".csv") else p + ".csv" for p in args.participants]
+
+    sys.exit(0 if run(args.folder, filenames, args.synthetic, args.tolerance, args.seed,
+                        args.single_tolerance, model_sets, args.precision) else 1)
@@ -0,0 +1,128 @@
+import numpy as np
+
+from experiment import norm_pdf
+
+
+class LinkingModel():
+    '''
+        Maps the predicted RTs of an agent onto the observed RTs of a
+        participant as
+
+            true_rt = intercept + slope * pred_rt + noise
+
+        where the noise is either normal or Student-t distributed.
+        The parameters are estimated by maximum likelihood for every
+        (participant, agent) pair at once: all arrays have the shape of
+        the leading axes of the predicted RTs, e.g. (P x A).
+    '''
+
+    def __init__(self, likelihood="normal", df=4, nr_iterations=50):
+        if likelihood not in ("normal", "student_t"):
+            raise ValueError(f"Unknown likelihood '{likelihood}', "
+                             "expected 'normal' or 'student_t'")
+        self.likelihood = likelihood
+        self.df = df
+        self.nr_iterations = nr_iterations
+
+        self.intercept = None
+        self.slope = None
+        self.sigma = None
+
+
+    def fit(self, pred_rts, true_rts):
+        '''
+            Fits the linking parameters given predicted RTs of shape
+            (..., A, N) and observed RTs of shape (..., N).
+            Missing observed RTs (NaN) are left out of the fit.
+
+            For normal noise the fit is the closed-form least squares
+            solution. For Student-t noise the same solution is iteratively
+            reweighted (EM with the degrees of freedom kept fixed).
+
+            RETURNS self
+        '''
+        x = np.asarray(pred_rts, dtype=float)
+        y = np.asarray(true_rts, dtype=float)[..., np.newaxis, :]
+        mask = np.broadcast_to(~np.isnan(y), x.shape)
+        y = np.broadcast_to(np.nan_to_num(y), x.shape)
+
+        weights = mask.astype(float)
+        self._weighted_fit(x, y, weights)
+
+        if self.likelihood == "student_t":
+            n = np.maximum(np.sum(weights, axis=-1), 1)
+            for _ in range(self.nr_iterations):
+                # E-step: expected precision of each observation
+                z2 = self._residuals(x, y)**2 / self.sigma[..., np.newaxis]**2
+                u = weights * (self.df + 1) / (self.df + z2)
+
+                # M-step: weighted regression, with the scale
+                # normalised by the number of observations
+                self._weighted_fit(x, y, u)
+                r2 = self._residuals(x, y)**2
+                self.sigma = self._floor(np.sqrt(np.sum(u * r2, axis=-1) / n))
+
+        return self
+
+
+    def _weighted_fit(self, x, y, w):
+        '''
+            Weighted least squares of y on x along the last axis.
+            Agents without variance in their predictions (e.g. the
+            baseline) get a slope of zero.
+        '''
+        sum_w = np.maximum(np.sum(w, axis=-1), 1e-12)
+        mean_x = np.sum(w * x, axis=-1) / sum_w
+        mean_y = np.sum(w * y, axis=-1) / sum_w
+
+        dx = x - mean_x[..., np.newaxis]
+        dy = y - mean_y[..., np.newaxis]
+        sxx = np.sum(w * dx**2, axis=-1)
+        sxy = np.sum(w * dx * dy, axis=-1)
+
+        self.slope = np.where(sxx > 1e-12, sxy / np.where(sxx > 1e-12, sxx, 1), 0.0)
+        self.intercept = mean_y - self.slope * mean_x
+        self.sigma = self._floor(np.sqrt(np.sum(w * self._residuals(x, y)**2, axis=-1) / sum_w))
+
+
+    def _residuals(self, x, y):
+        return y - self.intercept[..., np.newaxis] - self.slope[..., np.newaxis] * x
+
+
+    def _floor(self, sigma):
+        return np.maximum(sigma, 1e-6)
+
+
+    def select(self, index):
+        '''
+            Returns a new linking model with only the parameters
+            at the given index of the leading axes (e.g. one participant).
+        '''
+        model = LinkingModel(self.likelihood, self.df, self.nr_iterations)
+        model.intercept = self.intercept[index]
+        model.slope = self.slope[index]
+        model.sigma = self.sigma[index]
+        return model
+
+
+    def get_likelihoods(self, pred_rts, true_rts):
+        '''
+            Returns the likelihood of each observed RT under each agent,
+            in the same shape as the predicted RTs (..., A, N).
+        '''
+        loc = self.intercept[..., np.newaxis] + self.slope[..., np.newaxis] * pred_rts
+        scale = self.sigma[..., np.newaxis]
+        true_rts = np.asarray(true_rts)[..., np.newaxis, :]
+
+        if self.likelihood == "normal":
+            return norm_pdf(true_rts, loc=loc, scale=scale)
+
+        from scipy.stats import t
+        return t.pdf(true_rts, self.df, loc=loc, scale=scale)
+
+
+    def get_number_parameters(self):
+        '''
+            Returns the number of linking parameters per agent.
+        '''
+        return 3
@@ -1,183 +1,380 @@
-import experiment
-import numpy as np
-import matplotlib.pyplot as plt
+import argparse
 import os
+import numpy as np
 
-from Model_Baseline import *
-from Model_Chunking import *
-from Model_Connected import *
-from Model_Disconnected import *
-from Model_Conjunctive import *
-from Model_TP import *
+import experiment
+import fast
+from crossvalidation import cross_validate
+from linking import LinkingModel
+from precision import PRECISIONS, check_accuracy, count_dtype, encode, float_dtype
 
-from math import log, sqrt
-from scipy.stats import norm, zscore
+from Model_Baseline import BaselineLearner
+from Model_Chunking import JointChunkLearner
+from Model_Connected import ConnectedChunkLearner
+from Model_Disconnected import DisconnectedChunkLearner
+from Model_Conjunctive import ConjunctiveChunkLearner
+from Model_Phase import PhaseChunkLearner
+from Model_TP import TPLearner
 
 
 #######################################################################################
 #######################################################################################
 #######################################################################################
 '''
-    This file can simply be ran.
-    It will then go through each .txt file in the data folder.
+    This file can simply be ran (python main.py, see python main.py --help).
+    It will then go through each .csv file in the data folder.
     This data folder should be placed in the same folder as this script.
     For each file, it will create a separate series of result images and text files.
     In addition, it will average the posteriors per participant, and put those result
     in an image and text file as well.
+
+    The analysis is split in stages that can also be used on their own after
+    importing this file: compute (posteriors per participant), aggregate
+    (averages across participants), write (text files) and render (images).
+    Only render imports matplotlib.
 '''
 #######################################################################################
 #######################################################################################
 #######################################################################################
 
-def compare_rts(all_pred_rts, true_rts):
-    
-    # Gain likelihoods for each agent
-    likelihoods = norm.pdf(all_pred_rts, loc=true_rts)
+# The agents that can be compared, by name. The default ones are those of the paper.
+MODELS = {
+    "tp": TPLearner,
+    "chunking": JointChunkLearner,
+    "connected": ConnectedChunkLearner,
+    "disconnected": DisconnectedChunkLearner,
+    "conjunctive": ConjunctiveChunkLearner,
+    "baseline": BaselineLearner,
+    "chunking_phase_mixture": lambda values, dtype=float: PhaseChunkLearner(JointChunkLearner(values), True, dtype),
+    "connected_phase_mixture": lambda values, dtype=float: PhaseChunkLearner(ConnectedChunkLearner(values), True, dtype),
+    "disconnected_phase_mixture": lambda values, dtype=float: PhaseChunkLearner(DisconnectedChunkLearner(values), True, dtype),
+    "conjunctive_phase_mixture": lambda values, dtype=float: PhaseChunkLearner(ConjunctiveChunkLearner(values), True, dtype),
+}
+DEFAULT_MODELS = ["tp", "chunking", "connected", "disconnected", "conjunctive", "baseline"]
+
+# The agents whose count tables take a type (see precision.count_dtype)
+COUNTING_MODELS = ["chunking_phase_mixture", "connected_phase_mixture",
+                   "disconnected_phase_mixture", "conjunctive_phase_mixture"]
+
+# The stages that can be selected on the command line. compute always runs,
+# as the other stages use its results, so --stages compute (or --stages
+# without any stage) only computes the posteriors.
+STAGES = ["compute", "aggregate", "write", "render"]
+
+# The reference backend runs the learners of the Model_X.py files one
+# observation at a time. The fast backend computes the same (see fast.py
+# and harness.py).
+BACKENDS = ["reference", "fast"]
+
+
+def make_agents(values, models=DEFAULT_MODELS, precision="double", nr_trials=0):
+    '''
+        Creates the agents with the given names (see MODELS).
+
+        The count tables of the COUNTING_MODELS get the smallest type of
+        the precision that holds their largest prior pseudocount plus
+        nr_trials observations.
+    '''
+    agents = []
+    for model in models:
+        agent = MODELS[model](values)
+        if model in COUNTING_MODELS:
+            max_count = np.max(agent.counts) + nr_trials
+            agent = MODELS[model](values, count_dtype(max_count, precision))
+        agents.append(agent)
+    return agents
+
+
+def list_participants(folder="data/"):
+    '''
+        Returns the names of the csv files in the folder.
+    '''
+    return [f for f in os.listdir(folder) if f.endswith(".csv")]
+
+
+def compare_rts(all_pred_rts, true_rts, linking=None, backend="reference"):
+
+    # The recursion is always made in double precision, as in single
+    # precision small posteriors underflow to zero and never recover.
+    # Only the result gets the type of the predictions.
+    dtype = all_pred_rts.dtype
+    all_pred_rts = all_pred_rts.astype(np.float64)
+    true_rts = np.asarray(true_rts, dtype=np.float64)
+
+    # Gain likelihoods for each agent, either with unit normal noise
+    # or through the fitted linking model of this participant
+    if linking is None:
+        likelihoods = experiment.norm_pdf(all_pred_rts, loc=true_rts)
+    else:
+        likelihoods = linking.get_likelihoods(all_pred_rts, true_rts)
     likelihoods[np.where(np.isnan(likelihoods))] = 1
 
     # Determine posteriors over time
-    posteriors = likelihoods.copy()
+    if backend == "fast":
+        return fast.compare_rts(likelihoods).astype(dtype)
+
+    posteriors = likelihoods
     posteriors[:,0] = posteriors[:,0]/np.sum(posteriors[:,0])
     for i in range(likelihoods.shape[1]-1):
         posteriors[:,i+1] = posteriors[:,i] * posteriors[:,i+1]
         posteriors[:,i+1] = posteriors[:,i+1]/np.sum(posteriors[:,i+1])
-        
-    return posteriors
-    
 
-def process_data(agents, triplet_names, shapes, true_rts, filename):
+    return posteriors.astype(dtype)
+
+
+def predict_rts(agents, shapes, backend="reference"):
     # Make sure all the agents start with a blank slate
     for agent in agents:
         agent.reset()
-    
+
     # Get the predicted RTs for each agent given the data
-    all_pred_rts = np.zeros((len(agents), len(true_rts)))
+    run_experiment = fast.run_experiment if backend == "fast" else experiment.run_experiment
+    all_pred_rts = np.zeros((len(agents), len(shapes)))
     for i, agent in enumerate(agents):
-        pred_rts, _ = experiment.run_experiment(agent, shapes)
+        pred_rts, _ = run_experiment(agent, shapes)
         all_pred_rts[i, :] = np.array(pred_rts)
 
     # Perform zero-mean, unit-variance scaling (Z-scoring)
-    all_pred_rts = np.nan_to_num(zscore(all_pred_rts, axis=1))
+    return np.nan_to_num(experiment.zscore(all_pred_rts, axis=1))
 
-    # Get the posterior distributions overall
-    posteriors = compare_rts(all_pred_rts, true_rts)
 
-    # Determine posterior development per triplet type
-    triplet_types = sorted(list(set(triplet_names)))
-    triplet_posteriors = []
-    triplet_pred_rts = []
-    triplet_true_rts = []
-    for triplet_type in triplet_types:
-        indices = np.squeeze(np.where(np.array(triplet_names) == triplet_type))
-        triplet_posterior = compare_rts(all_pred_rts[:, indices], true_rts[indices])
-        triplet_posteriors.append(triplet_posterior)
+def predict_participant(folder, filename, models=DEFAULT_MODELS, backend="reference",
+                        precision="double"):
+    '''
+        Reads the data of one participant and gets the predicted RTs of
+        the agents. This is the expensive part of the analysis, and can
+        be ran in worker processes.
 
-        triplet_pred_rts.append(all_pred_rts[:,indices])
-        triplet_true_rts.append(true_rts[indices])
-        
-    triplet_posteriors = np.array(triplet_posteriors)
-    #triplet_posteriors = np.squeeze(triplet_posteriors)
-        
-    # Save the images
-    experiment.create_posterior_images(agents, filename, posteriors, triplet_types, triplet_posteriors)
-    #experiment.create_rt_images(agents, filename, true_rts, all_pred_rts)
-
-    # Save the data in a file
-    experiment.create_files(agents, filename, posteriors, triplet_types, triplet_posteriors)
-
-    return all_pred_rts, true_rts, posteriors, triplet_posteriors #np.array(triplet_pred_rts), np.array(triplet_true_rts)
-
-
-
-
-folder = "data/"
-
-nr_files = 0
-nr_agents = 0
-nr_stimuli = 0
-nr_triplet_types = 0
-
-full_posterior = []
-full_triplet_posterior = []
-full_pred_rts = []
-full_true_rts = []
-
-print("Processing files...")
-for filename in os.listdir(folder):
-    if filename.endswith(".csv"):
-        nr_files += 1
-
-n = 0
-for filename in os.listdir(folder):
-    if filename.endswith(".csv"):
-        print(f"\tFile {filename} ({n+1}/{nr_files})")
-        
-        triplet_names, shapes, true_rts = experiment.read_data(folder + filename, delimiter=",")
-
-        values = list(set(shapes))
-        agents = [TPLearner(values),
-                  JointChunkLearner(values),
-                  ConnectedChunkLearner(values),
-                  DisconnectedChunkLearner(values),
-                  ConjunctiveChunkLearner(values),
-                  BaselineLearner(values),
-                  ]
-
-        # Process the data through the agents
-        pred_rts, true_rts, posterior, triplet_posterior = process_data(agents, triplet_names, shapes, true_rts, filename)
-
-        # Create empty matrices after first experiment
-        if n == 0:
-            nr_agents = len(agents)
-            nr_stimuli = pred_rts.shape[1]
-            triplet_types = sorted(list(set(triplet_names)))
-            nr_triplet_types = len(triplet_types)
-            
-            full_triplet_types = triplet_types
-            full_pred_rts = np.zeros((nr_files, nr_agents, nr_stimuli))
-            full_true_rts = np.zeros((nr_files, nr_stimuli))
-
-            full_posterior = np.zeros((nr_files, nr_agents, nr_stimuli))
-            full_triplet_posterior = np.zeros((nr_files, nr_triplet_types, nr_agents,
-                                               int(nr_stimuli/nr_triplet_types)))
-
-        # Save the data from this file
-        full_pred_rts[n,:,:] = pred_rts
-        full_true_rts[n,:] = true_rts
+        RETURNS agents, triplet_names, true_rts and the (AxN) predicted RTs
+    '''
+    triplet_names, shapes, true_rts = experiment.read_data(os.path.join(folder, filename), delimiter=",")
 
-        full_posterior[n,:,:] = posterior
-        full_triplet_posterior[n,:,:,:] = triplet_posterior
-
-        n += 1
-
-
-print("Creating posterior files across participants...")
-# Average the posterior probabilities
-# and extract the SE
-avg_posterior = np.mean(full_posterior, axis=0)
-posterior_se = np.std(full_posterior, axis=0) / np.sqrt(n)
-
-# Average the triplet posterior probabilities
-avg_triplet_posterior = np.mean(full_triplet_posterior, axis=0)
-triplet_posterior_se = np.std(full_triplet_posterior, axis=0) / np.sqrt(n)
-
-# Average the predicted response times
-avg_pred_rts = np.mean(full_pred_rts, axis=0)
-
-# Average the true response times
-avg_true_rts = np.nanmean(full_true_rts, axis=0)
+    values = list(set(shapes))
+    agents = make_agents(values, models, precision, len(shapes))
+    return agents, triplet_names, true_rts, predict_rts(agents, shapes, backend)
 
 
-experiment.create_posterior_images(agents, "general", avg_posterior,
-                                   triplet_types, avg_triplet_posterior,
-                                   posterior_se, triplet_posterior_se)
+def _predict_participant(arguments):
+    return predict_participant(*arguments)
 
-experiment.create_rt_images(agents, "general", avg_true_rts, avg_pred_rts)
-experiment.create_files(agents, "general", avg_posterior, triplet_types,
-                        avg_triplet_posterior)
-print("Done!")
 
+def process_data(triplet_codes, nr_triplet_types, all_pred_rts, true_rts, linking=None,
+                 backend="reference"):
+    # Get the posterior distributions overall
+    posteriors = compare_rts(all_pred_rts, true_rts, linking, backend)
 
+    # Determine posterior development per triplet type
+    triplet_posteriors = []
+    for triplet_type in range(nr_triplet_types):
+        indices = np.squeeze(np.where(triplet_codes == triplet_type))
+        triplet_posterior = compare_rts(all_pred_rts[:, indices], true_rts[indices], linking, backend)
+        triplet_posteriors.append(triplet_posterior)
 
+    triplet_posteriors = np.array(triplet_posteriors)
 
+    return posteriors, triplet_posteriors
+
+
+def compute(folder="data/", filenames=None, models=DEFAULT_MODELS,
+            fit_rt_model=False, rt_likelihood="normal", processes=1, precision="double",
+            backend="reference"):
+    '''
+        Computes the predicted RTs and posteriors of every participant.
+
+        If fit_rt_model is True, the intercept, slope and noise of the RT
+        mapping are fitted per participant and agent (see linking.py),
+        instead of assuming unit normal noise on the Z-scored RTs (as in
+        the paper). rt_likelihood is 'normal' or 'student_t'.
+
+        With processes > 1, the participants are divided over that many
+        worker processes.
+
+        precision is 'double' or 'single' (see precision.py), and sets
+        the types of the arrays that are returned.
+
+        backend is 'reference' or 'fast' (see fast.py).
+
+        RETURNS a dictionary with the agents (of the last participant, for
+        their names), filenames, triplet types, and the arrays
+        triplet_codes (PxN, the index of the triplet type of each
+        stimulus), pred_rts (PxAxN), true_rts (PxN), posterior (PxAxN) and
+        triplet_posterior (PxTxAxN/T), with P the number of participants.
+    '''
+    dtype = float_dtype(precision)
+    if filenames is None:
+        filenames = list_participants(folder)
+    nr_files = len(filenames)
+
+    print("Processing files...")
+    arguments = [(folder, filename, models, backend, precision) for filename in filenames]
+    if processes > 1:
+        from multiprocessing import Pool
+        with Pool(processes) as pool:
+            predictions = pool.map(_predict_participant, arguments)
+    else:
+        predictions = []
+        for n, filename in enumerate(filenames):
+            print(f"\tFile {filename} ({n+1}/{nr_files})")
+            predictions.append(predict_participant(*arguments[n]))
+
+    agents = predictions[-1][0]
+    triplet_codes, triplet_types = encode([triplet_names for _, triplet_names, _, _ in predictions],
+                                          precision)
+    full_true_rts = np.array([true_rts for _, _, true_rts, _ in predictions], dtype=dtype)
+    full_pred_rts = np.array([pred_rts for _, _, _, pred_rts in predictions], dtype=dtype)
+
+    # Fit the linking model of all participants and agents at once
+    linking = None
+    if fit_rt_model:
+        print("Fitting RT linking model...")
+        linking = LinkingModel(rt_likelihood).fit(full_pred_rts, full_true_rts)
+
+    print("Determining posteriors...")
+    nr_triplet_types = len(triplet_types)
+    nr_agents, nr_stimuli = full_pred_rts.shape[1:]
+    full_posterior = np.zeros((nr_files, nr_agents, nr_stimuli), dtype=dtype)
+    full_triplet_posterior = np.zeros((nr_files, nr_triplet_types, nr_agents,
+                                       int(nr_stimuli/nr_triplet_types)), dtype=dtype)
+    for n in range(nr_files):
+        participant_linking = None if linking is None else linking.select(n)
+        posterior, triplet_posterior = process_data(triplet_codes[n], nr_triplet_types,
+                                                    full_pred_rts[n], full_true_rts[n],
+                                                    participant_linking, backend)
+        full_posterior[n,:,:] = posterior
+        full_triplet_posterior[n,:,:,:] = triplet_posterior
 
+    return {"agents": agents,
+            "filenames": filenames,
+            "triplet_codes": triplet_codes,
+            "triplet_types": triplet_types,
+            "linking": linking,
+            "pred_rts": full_pred_rts,
+            "true_rts": full_true_rts,
+            "posterior": full_posterior,
+            "triplet_posterior": full_triplet_posterior}
+
+
+def aggregate(results):
+    '''
+        Averages the results of compute across participants.
+        RETURNS a dictionary with the averages and standard errors.
+    '''
+    n = len(results["filenames"])
+
+    return {# Average the posterior probabilities
+            # and extract the SE
+            "avg_posterior": np.mean(results["posterior"], axis=0),
+            "posterior_se": np.std(results["posterior"], axis=0) / np.sqrt(n),
+
+            # Average the triplet posterior probabilities
+            "avg_triplet_posterior": np.mean(results["triplet_posterior"], axis=0),
+            "triplet_posterior_se": np.std(results["triplet_posterior"], axis=0) / np.sqrt(n),
+
+            # Average the predicted response times
+            "avg_pred_rts": np.mean(results["pred_rts"], axis=0),
+
+            # Average the true response times
+            "avg_true_rts": np.nanmean(results["true_rts"], axis=0)}
+
+
+def write(results, summary=None):
+    '''
+        Saves the posteriors of every participant, and of the
+        summary of aggregate if given, as text files.
+    '''
+    agents = results["agents"]
+    triplet_types = results["triplet_types"]
+    for n, filename in enumerate(results["filenames"]):
+        experiment.create_files(agents, filename, results["posterior"][n], triplet_types,
+                                results["triplet_posterior"][n])
+
+    if summary is not None:
+        experiment.create_files(agents, "general", summary["avg_posterior"], triplet_types,
+                                summary["avg_triplet_posterior"])
+
+
+def render(results, summary=None):
+    '''
+        Saves the posteriors of every participant, and of the
+        summary of aggregate if given, as images.
+    '''
+    agents = results["agents"]
+    triplet_types = results["triplet_types"]
+    for n, filename in enumerate(results["filenames"]):
+        experiment.create_posterior_images(agents, filename, results["posterior"][n], triplet_types,
+                                           results["triplet_posterior"][n])
+
+    if summary is not None:
+        experiment.create_posterior_images(agents, "general", summary["avg_posterior"],
+                                           triplet_types, summary["avg_triplet_posterior"],
+                                           summary["posterior_se"], summary["triplet_posterior_se"])
+
+        experiment.create_rt_images(agents, "general", summary["avg_true_rts"], summary["avg_pred_rts"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the Bayesian learners on the participant data.")
+    parser.add_argument("--folder", default="data/",
+                        help="folder with the participant csv files (default: data/)")
+    parser.add_argument("--participants", nargs="+", default=None,
+                        help="participant files to use, e.g. 1S 2S (default: all)")
+    parser.add_argument("--models", nargs="+", default=DEFAULT_MODELS, choices=list(MODELS),
+                        help="agents to compare (default: those of the paper)")
+    parser.add_argument("--stages", nargs="*", default=STAGES, choices=STAGES,
+                        help="stages to run (default: all); compute always runs, "
+                             "so --stages compute only computes the posteriors")
+    parser.add_argument("--fit-rt-model", action="store_true",
+                        help="fit intercept, slope and noise of the RT mapping per participant and agent")
+    parser.add_argument("--rt-likelihood", default="normal", choices=["normal", "student_t"],
+                        help="noise distribution of the fitted RT mapping")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="number of worker processes for computing the participants")
+    parser.add_argument("--backend", default="reference", choices=BACKENDS,
+                        help="implementation of the learners and posteriors (default: reference)")
+    parser.add_argument("--precision", default="double", choices=PRECISIONS,
+                        help="precision of the cohort arrays (default: double)")
+    parser.add_argument("--check-precision", action="store_true",
+                        help="also compute in double precision, and report the differences")
+    parser.add_argument("--cross-validate", type=int, default=None, metavar="K",
+                        help="cross-validate the group-level winner with K folds (0: leave-one-participant-out)")
+    args = parser.parse_args(argv)
+
+    filenames = None
+    if args.participants is not None:
+        filenames = [p if p.endswith(".csv") else p + ".csv" for p in args.participants]
+
+    results = compute(args.folder, filenames, args.models, args.fit_rt_model,
+                      args.rt_likelihood, args.processes, args.precision, args.backend)
+
+    if args.check_precision:
+        reference = compute(args.folder, filenames, args.models, args.fit_rt_model,
+                            args.rt_likelihood, args.processes, backend=args.backend)
+        report = check_accuracy(reference, results)
+        print(f"Largest difference with double precision: posterior {report['posterior']:.2e}, "
+              f"triplet posterior {report['triplet_posterior']:.2e}, "
+              f"predicted RTs {report['pred_rts']:.2e}")
+        print(f"Same winning agent for every participant: {report['same_winners']}")
+        print(f"Memory: {report['nbytes']} bytes instead of {report['reference_nbytes']}")
+
+    summary = None
+    if "aggregate" in args.stages:
+        print("Creating posterior files across participants...")
+        summary = aggregate(results)
+
+    if args.cross_validate is not None:
+        cv = cross_validate(results, args.cross_validate)
+        print(f"Held-out participants matching the group-level winner: {cv['agreement']:.2f}")
+        for triplet_type, agreement in zip(results["triplet_types"], cv["triplet_agreement"]):
+            print(f"\t{triplet_type}: {agreement:.2f}")
+
+    if "write" in args.stages:
+        write(results, summary)
+    if "render" in args.stages:
+        render(results, summary)
+
+    print("Done!")
+    return results, summary
+
+
+if __name__ == "__main__":
+    main()
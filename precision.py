@@ -0,0 +1,82 @@
+import numpy as np
+
+'''
+    Precision policies for the cohort arrays of main.compute.
+
+    "double" keeps everything in float64, as in the paper.
+    "single" stores the predicted and true RTs and the posteriors as
+    float32, and uses the smallest integer types for codes and counts.
+    This halves the memory of the cohort arrays, at an error of the
+    order of 1e-6 in the posteriors (see check_accuracy).
+'''
+
+PRECISIONS = ["double", "single"]
+
+
+def float_dtype(precision="double"):
+    '''
+        Returns the floating point type of the precision.
+    '''
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}', expected one of {PRECISIONS}")
+    return np.float64 if precision == "double" else np.float32
+
+
+def code_dtype(nr_codes, precision="double"):
+    '''
+        Returns the integer type used for nr_codes different labels
+        (e.g. shapes or triplet types).
+    '''
+    if precision == "double":
+        return np.int64
+    return np.int8 if nr_codes <= np.iinfo(np.int8).max else np.int16
+
+
+def count_dtype(max_count, precision="double"):
+    '''
+        Returns the type of a count table whose counts stay
+        below max_count. The counts are floats in double precision.
+    '''
+    if precision == "double":
+        return np.float64
+    return np.uint16 if max_count <= np.iinfo(np.uint16).max else np.uint32
+
+
+def encode(labels, precision="double"):
+    '''
+        Converts a (nested) list of labels into integer codes.
+
+        RETURNS the codes as an array of the shape of labels,
+                and the sorted list of different labels
+    '''
+    names, codes = np.unique(np.array(labels), return_inverse=True)
+    return codes.reshape(np.shape(labels)).astype(code_dtype(len(names), precision)), names.tolist()
+
+
+def get_nbytes(results):
+    '''
+        Returns the number of bytes of all arrays in the results.
+    '''
+    return sum(value.nbytes for value in results.values() if isinstance(value, np.ndarray))
+
+
+def check_accuracy(reference, results):
+    '''
+        Compares results of main.compute at reduced precision with the
+        double precision reference.
+
+        RETURNS a dictionary with the largest absolute difference of the
+        predicted RTs and posteriors, whether every participant keeps
+        the same winning agent on the final posterior, and the memory
+        of both.
+    '''
+    report = {}
+    for key in ("pred_rts", "posterior", "triplet_posterior"):
+        difference = np.abs(reference[key] - results[key].astype(np.float64))
+        report[key] = np.nanmax(difference)
+
+    report["same_winners"] = bool(np.all(np.argmax(reference["posterior"][..., -1], axis=-1) ==
+                                         np.argmax(results["posterior"][..., -1], axis=-1)))
+    report["reference_nbytes"] = get_nbytes(reference)
+    report["nbytes"] = get_nbytes(results)
+    return report